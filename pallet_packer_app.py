@@ -1,126 +1,293 @@
 import streamlit as st
 import pandas as pd
-import math
+import numpy as np
+import xlsxwriter
 from io import BytesIO
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; run the packing kernel as plain Python
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
 # Constants
 PALLET_LENGTH = 122
 PALLET_WIDTH = 102
 PALLET_HEIGHT = 194
 
 # --- Safe carton packing logic ---
-def calculate_cartons_per_layer(carton_L, carton_W):
-    try:
-        carton_L = float(carton_L)
-        carton_W = float(carton_W)
-        if carton_L <= 0 or carton_W <= 0:
-            return 0, (0, 0)
-    except (ValueError, TypeError):
-        return 0, (0, 0)
-
-    orientations = [(carton_L, carton_W), (carton_W, carton_L)]
-    max_count = 0
-    best_orientation = (0, 0)
-    for l, w in orientations:
-        try:
-            count_L = PALLET_LENGTH // l
-            count_W = PALLET_WIDTH // w
-            total = count_L * count_W
-            if total > max_count:
-                max_count = total
-                best_orientation = (l, w)
-        except ZeroDivisionError:
+@njit(cache=True)
+def _vec_cpl(carton_L, carton_W):
+    # Cartons per layer for arrays of carton footprints, trying both orientations.
+    # Returns (cartons_per_layer, used_L, used_W); ties keep the (L, W) orientation.
+    t0 = (PALLET_LENGTH // carton_L) * (PALLET_WIDTH // carton_W)
+    t1 = (PALLET_LENGTH // carton_W) * (PALLET_WIDTH // carton_L)
+    keep = t0 >= t1
+    return np.where(keep, t0, t1), np.where(keep, carton_L, carton_W), np.where(keep, carton_W, carton_L)
+
+@njit(cache=True)
+def _place_in_rects(l, w, count, rx, ry, rl, rw, floor_fit, floor_l, floor_w):
+    # Places up to `count` cartons of footprint (l, w) into the layer's free rectangles.
+    # Each block is a grid of full rows plus one partial row; the rectangle it used is split
+    # (guillotine) into the strip below the block, the strip right of the full rows and
+    # the rest of the partial row. Returns (placed, length_extent, width_extent).
+    # floor_fit/floor_l/floor_w are the precomputed cartons per layer and orientation for an
+    # empty pallet floor; pass floor_fit > 0 only while rect 0 is still the whole floor.
+    placed = 0.0
+    length_extent = 0.0
+    width_extent = 0.0
+    r = 0
+    while r < len(rl) and placed < count:
+        x, y, rect_l, rect_w = rx[r], ry[r], rl[r], rw[r]
+        if r == 0 and placed == 0 and floor_fit > 0:
+            a, b, fit = floor_l, floor_w, floor_fit
+        else:
+            f0 = (rect_l // l) * (rect_w // w)
+            f1 = (rect_l // w) * (rect_w // l)
+            if f0 >= f1:
+                a, b, fit = l, w, f0
+            else:
+                a, b, fit = w, l, f1
+        if fit == 0:
+            r += 1
             continue
-    return max_count, best_orientation
-
-def pack_fba_group(group_df):
-    group_df['Volume'] = group_df['Length'] * group_df['Width'] * group_df['Height']
-    group_df = group_df.sort_values(by='Volume', ascending=False).reset_index(drop=True)
-    pallets = []
-    pallet_id = 1
-    remaining_cartons = group_df.copy()
-
-    while remaining_cartons['# of Cartons'].sum() > 0:
-        height_used = 0
-        max_length_used = 0
-        max_width_used = 0
-        pallet_summary = {
-            'FBA Code': remaining_cartons['FBA Code'].iloc[0],
-            'Pallet #': pallet_id,
-            'Packed Cartons': 0,
-            'Details': [],
-            'Total Height Used': 0,
-            'Total Length Used': 0,
-            'Total Width Used': 0
-        }
-
-        for idx, row in remaining_cartons.iterrows():
-            if row['# of Cartons'] <= 0:
-                continue
-
-            cartons_per_layer, (used_L, used_W) = calculate_cartons_per_layer(row['Length'], row['Width'])
-            if cartons_per_layer == 0:
-                continue
-
-            max_layers = (PALLET_HEIGHT - height_used) // row['Height']
-            max_cartons = cartons_per_layer * max_layers
-            cartons_to_pack = min(row['# of Cartons'], max_cartons)
-            if cartons_to_pack == 0:
-                continue
-
-            layers_used = math.ceil(cartons_to_pack / cartons_per_layer)
-            height_add = layers_used * row['Height']
-            if height_used + height_add > PALLET_HEIGHT:
-                continue
-
-            # Pack cartons
-            remaining_cartons.at[idx, '# of Cartons'] -= cartons_to_pack
-            height_used += height_add
-            pallet_summary['Packed Cartons'] += cartons_to_pack
-
-            count_L = PALLET_LENGTH // used_L
-            count_W = PALLET_WIDTH // used_W
-            rows_used = math.ceil(min(cartons_to_pack, cartons_per_layer) / count_L)
-
-            length_occupied = min(PALLET_LENGTH, count_L * used_L)
-            width_occupied = min(PALLET_WIDTH, rows_used * used_W)
-
-            max_length_used = max(max_length_used, length_occupied)
-            max_width_used = max(max_width_used, width_occupied)
-
-            pallet_summary['Details'].append({
-                'Carton Size': f"{row['Length']}x{row['Width']}x{row['Height']}",
-                'Packed': cartons_to_pack
-            })
-
-        if pallet_summary['Packed Cartons'] > 0:
-            pallet_summary['Total Height Used'] = height_used
-            pallet_summary['Total Length Used'] = max_length_used
-            pallet_summary['Total Width Used'] = max_width_used
-            pallets.append(pallet_summary)
-            pallet_id += 1
+
+        k = min(count - placed, fit)
+        cols = rect_l // a
+        rows = -(-k // cols)
+        last = k - (rows - 1) * cols
+        placed += k
+        length_extent = max(length_extent, x + (cols * a if rows > 1 else last * a))
+        width_extent = max(width_extent, y + rows * b)
+
+        # Rect r becomes the strip below the block and is re-examined (the other orientation may fit)
+        ry[r] = y + rows * b
+        rw[r] = rect_w - rows * b
+        if rows > 1 and rect_l > cols * a:
+            rx.append(x + cols * a)
+            ry.append(y)
+            rl.append(rect_l - cols * a)
+            rw.append((rows - 1) * b)
+        if rect_l > last * a:
+            rx.append(x + last * a)
+            ry.append(y + (rows - 1) * b)
+            rl.append(rect_l - last * a)
+            rw.append(b)
+    return placed, length_extent, width_extent
+
+@njit(cache=True)
+def _pack_group_nb(L, W, H, counts):
+    # Shelf packing kernel for one FBA code; L, W, H, counts are position-aligned, tallest first.
+    # Each layer takes the height of the first carton placed in it, and shorter cartons
+    # share the layer's leftover floor area before a new layer is opened.
+    # Returns per-pallet (packed, height, length, width) and per-detail (pallet index, row, packed).
+    counts = counts.copy()
+    n = len(counts)
+    cpl, used_Ls, used_Ws = _vec_cpl(L, W)
+    # Only rows that can ever be placed; depleted rows are pruned after every layer
+    packable = (counts > 0) & (cpl > 0) & (H <= PALLET_HEIGHT)
+    active = list(np.nonzero(packable)[0])
+    remaining_total = counts[packable].sum()
+    packed_here = np.zeros(n)
+
+    packed = []
+    heights = []
+    lengths = []
+    widths = []
+    detail_pallet = []
+    detail_idx = []
+    detail_packed = []
+
+    while remaining_total > 0:
+        height_used = 0.0
+        max_length_used = 0.0
+        max_width_used = 0.0
+        packed_total = 0.0
+        touched = []
+
+        # Open layers until no remaining carton fits in the height left
+        while remaining_total > 0:
+            layer_h = 0.0
+            rx = [0.0]
+            ry = [0.0]
+            rl = [PALLET_LENGTH * 1.0]
+            rw = [PALLET_WIDTH * 1.0]
+
+            for i in active:
+                if counts[i] <= 0:
+                    continue
+                if layer_h == 0:
+                    if height_used + H[i] > PALLET_HEIGHT:
+                        continue
+                elif H[i] > layer_h:
+                    continue
+
+                # An empty layer's floor fit is this row's precomputed cartons per layer
+                floor_fit = cpl[i] if layer_h == 0 else 0
+                cartons_to_pack, length_occupied, width_occupied = _place_in_rects(
+                    L[i], W[i], counts[i], rx, ry, rl, rw, floor_fit, used_Ls[i], used_Ws[i])
+                if cartons_to_pack == 0:
+                    continue
+                if layer_h == 0:
+                    layer_h = H[i]
+
+                # Pack cartons
+                counts[i] -= cartons_to_pack
+                remaining_total -= cartons_to_pack
+                packed_total += cartons_to_pack
+                if packed_here[i] == 0:
+                    touched.append(i)
+                packed_here[i] += cartons_to_pack
+
+                max_length_used = max(max_length_used, min(PALLET_LENGTH, length_occupied))
+                max_width_used = max(max_width_used, min(PALLET_WIDTH, width_occupied))
+                if remaining_total == 0:
+                    break
+
+            if layer_h == 0:
+                break
+            height_used += layer_h
+            active = [i for i in active if counts[i] > 0]
+
+        if packed_total > 0:
+            for i in touched:
+                detail_pallet.append(len(packed))
+                detail_idx.append(i)
+                detail_packed.append(packed_here[i])
+                packed_here[i] = 0
+            packed.append(packed_total)
+            heights.append(height_used)
+            lengths.append(max_length_used)
+            widths.append(max_width_used)
         else:
             break
 
-    return pallets
+    return packed, heights, lengths, widths, detail_pallet, detail_idx, detail_packed
+
+OUTPUT_COLUMNS = ['FBA Code', 'Pallet #', 'Packed Cartons', 'Details',
+                  'Total Height Used', 'Total Length Used', 'Total Width Used']
+
+def pack_fba_group(fba_code, L, W, H, counts, sizes, columns):
+    # Appends this group's pallets to `columns`, a dict of per-column lists keyed by OUTPUT_COLUMNS
+    # sizes holds the preformatted "LxWxH" label for each row
+    # First-fit decreasing: tallest cartons first, then largest footprint; lexsort is stable
+    order = np.lexsort((-(L * W), -H))
+    L, W, H, counts, sizes = L[order], W[order], H[order], counts[order], sizes[order]
+    packed, heights, lengths, widths, detail_pallet, detail_idx, detail_packed = _pack_group_nb(L, W, H, counts)
+
+    # The kernel accumulates in float64; hand back the input's own types so whole numbers stay integers
+    dim_type = np.result_type(L, W, H)
+    packed = np.asarray(packed).astype(counts.dtype)
+    heights = np.asarray(heights).astype(dim_type)
+    lengths = np.asarray(lengths).astype(dim_type)
+    widths = np.asarray(widths).astype(dim_type)
+    detail_packed = np.asarray(detail_packed).astype(counts.dtype)
+
+    n_pallets = len(packed)
+    details = [[] for _ in range(n_pallets)]
+    for p, i, n_packed in zip(detail_pallet, detail_idx, detail_packed):
+        details[p].append(f"{sizes[i]}:{n_packed}")
+
+    columns['FBA Code'].extend([fba_code] * n_pallets)
+    columns['Pallet #'].extend(range(1, n_pallets + 1))
+    columns['Packed Cartons'].extend(packed)
+    columns['Details'].extend('; '.join(d) for d in details)
+    columns['Total Height Used'].extend(heights)
+    columns['Total Length Used'].extend(lengths)
+    columns['Total Width Used'].extend(widths)
 
 def pack_all(df):
-    all_pallets = []
-    for fba_code, group in df.groupby("FBA Code"):
-        pallets = pack_fba_group(group.copy())
-        all_pallets.extend(pallets)
-    return all_pallets
+    columns = {col: [] for col in OUTPUT_COLUMNS}
+    # Sort once by FBA Code and slice contiguous groups out of the columns
+    df_sorted = df.sort_values(by='FBA Code', kind='stable')
+    codes = df_sorted['FBA Code'].to_numpy()
+    L = df_sorted['Length'].to_numpy()
+    W = df_sorted['Width'].to_numpy()
+    H = df_sorted['Height'].to_numpy()
+    N = df_sorted['# of Cartons'].to_numpy()
+    # Format every carton size label in one vectorized pass
+    sizes = (df_sorted['Length'].astype(str) + 'x' + df_sorted['Width'].astype(str)
+             + 'x' + df_sorted['Height'].astype(str)).to_numpy()
+
+    _, starts = np.unique(codes, return_index=True)
+    ends = np.r_[starts[1:], len(codes)]
+    for s, e in zip(starts, ends):
+        pack_fba_group(codes[s], L[s:e], W[s:e], H[s:e], N[s:e], sizes[s:e], columns)
+    return pd.DataFrame(columns)
 
 def convert_to_excel(result):
     df_out = pd.DataFrame(result)
-    df_out = df_out.astype(str)
 
+    # Stream rows straight into xlsxwriter, keeping numeric cells numeric
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df_out.to_excel(writer, sheet_name='Palletization Output', index=False)
+    workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+    ws = workbook.add_worksheet('Palletization Output')
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    ws.write_row(0, 0, [str(c) for c in df_out.columns], header_format)
+    for i, row in enumerate(df_out.itertuples(index=False, name=None), start=1):
+        ws.write_row(i, 0, row)
+    workbook.close()
     output.seek(0)
     return output
 
+def read_upload(file_bytes, file_name):
+    if file_name.endswith(".csv"):
+        return pd.read_csv(BytesIO(file_bytes))
+
+    # pandas' openpyxl reader already opens the workbook read-only and reads the first sheet
+    return pd.read_excel(BytesIO(file_bytes), engine='openpyxl')
+
+def clean_input(df):
+    # Type conversion
+    df['FBA Code'] = df['FBA Code'].astype(str)
+    for col in ['# of Cartons', 'Length', 'Width', 'Height']:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Filter invalid rows in one pass; NaN compares False, so missing values drop out too.
+    # A blank FBA Code stays NaN after astype(str) and would break the sort in pack_all.
+    mask = df['FBA Code'].notna() & (df['# of Cartons'] > 0) & (df['Length'] > 0) & (df['Width'] > 0) & (df['Height'] > 0)
+    df = df.loc[mask].reset_index(drop=True)
+
+    # Narrow whole-number columns to int32 for the packing kernel; fractional sizes stay float
+    narrow = {}
+    for col in ['# of Cartons', 'Length', 'Width', 'Height']:
+        values = df[col].to_numpy()
+        if (values % 1 == 0).all() and (values <= np.iinfo(np.int32).max).all():
+            narrow[col] = np.int32
+    return df.astype(narrow)
+
+# --- Cached per upload, so widget reruns don't repeat parsing, packing or Excel export ---
+# Bounded so a long-running shared server doesn't keep every distinct upload in memory
+UPLOAD_CACHE_ENTRIES = 8
+
+@st.cache_data(show_spinner=False, max_entries=UPLOAD_CACHE_ENTRIES)
+def _parse_cached(file_bytes, file_name):
+    df = read_upload(file_bytes, file_name)
+    # Clean column names
+    df.columns = df.columns.str.strip()
+    return df
+
+@st.cache_data(show_spinner=False, max_entries=UPLOAD_CACHE_ENTRIES)
+def _pack_cached(file_bytes, file_name):
+    df = clean_input(_parse_cached(file_bytes, file_name))
+    return df, pack_all(df)
+
+@st.cache_data(show_spinner=False, max_entries=UPLOAD_CACHE_ENTRIES)
+def _excel_cached(file_bytes, file_name):
+    _, result = _pack_cached(file_bytes, file_name)
+    return convert_to_excel(result).getvalue()
+
+# The template never changes, so build it once per server process
+@st.cache_resource
+def _template_bytes():
+    template = pd.DataFrame(columns=['FBA Code', '# of Cartons', 'Length', 'Width', 'Height'])
+    template_io = BytesIO()
+    with pd.ExcelWriter(template_io, engine='xlsxwriter') as writer:
+        template.to_excel(writer, index=False)
+    return template_io.getvalue()
+
 # ---------------------- Streamlit UI ----------------------
 
 st.title("📦 Palletization Tool (FBA Wise)")
@@ -129,56 +296,34 @@ st.write("Upload an Excel or CSV file containing FBA carton data.")
 uploaded_file = st.file_uploader("Upload File", type=["xlsx", "csv"])
 
 # Provide a downloadable template
-template = pd.DataFrame(columns=['FBA Code', '# of Cartons', 'Length', 'Width', 'Height'])
-template_io = BytesIO()
-with pd.ExcelWriter(template_io, engine='xlsxwriter') as writer:
-    template.to_excel(writer, index=False)
-template_io.seek(0)
-
 st.download_button(
     label="📥 Download Uploading Template",
-    data=template_io,
+    data=_template_bytes(),
     file_name="Palletization_Template.xlsx",
     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 )
 
 if uploaded_file is not None:
     try:
-        if uploaded_file.name.endswith(".csv"):
-            df = pd.read_csv(uploaded_file)
-        else:
-            df = pd.read_excel(uploaded_file)
-
-        # Clean column names
-        df.columns = df.columns.str.strip()
+        file_bytes = uploaded_file.getvalue()
+        df = _parse_cached(file_bytes, uploaded_file.name)
 
         # Ensure required columns are present
         required_columns = {'FBA Code', '# of Cartons', 'Length', 'Width', 'Height'}
         if not required_columns.issubset(df.columns):
             st.error(f"Missing required columns: {required_columns - set(df.columns)}")
         else:
-            # Type conversion
-            df['FBA Code'] = df['FBA Code'].astype(str)
-            for col in ['# of Cartons', 'Length', 'Width', 'Height']:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            # Filter invalid rows
-            df = df.dropna(subset=['# of Cartons', 'Length', 'Width', 'Height'])
-            df = df[(df['# of Cartons'] > 0) & (df['Length'] > 0) & (df['Width'] > 0) & (df['Height'] > 0)]
+            df, result = _pack_cached(file_bytes, uploaded_file.name)
 
             st.success("File uploaded successfully!")
             st.subheader("📋 Preview of Uploaded Data")
             st.dataframe(df.head())
 
-            result = pack_all(df)
-
-            if result:
+            if not result.empty:
                 st.subheader("📦 Palletization Summary")
-                result_df = pd.DataFrame(result)
-                result_df = result_df.astype(str)
-                st.dataframe(result_df)
+                st.dataframe(result)
 
-                excel_file = convert_to_excel(result_df)
+                excel_file = _excel_cached(file_bytes, uploaded_file.name)
                 st.download_button(
                     label="📥 Download Excel File",
                     data=excel_file,
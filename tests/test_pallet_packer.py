@@ -0,0 +1,155 @@
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+# Keep numba's on-disk cache away from the one the Streamlit app writes next to the script
+os.environ.setdefault("NUMBA_CACHE_DIR", tempfile.mkdtemp())
+
+import numpy as np
+import pandas as pd
+
+APP_PATH = Path(__file__).resolve().parents[1] / "pallet_packer_app.py"
+spec = importlib.util.spec_from_file_location("pallet_packer_app", APP_PATH)
+app = importlib.util.module_from_spec(spec)
+sys.modules["pallet_packer_app"] = app
+spec.loader.exec_module(app)
+
+FLOOR_L = float(app.PALLET_LENGTH)
+FLOOR_W = float(app.PALLET_WIDTH)
+
+
+def _random_upload(seed, n_rows, n_codes):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'FBA Code': rng.choice([f"FBA{i}" for i in range(n_codes)], n_rows),
+        '# of Cartons': rng.integers(0, 80, n_rows),
+        'Length': rng.integers(10, 130, n_rows),
+        'Width': rng.integers(10, 110, n_rows),
+        'Height': rng.integers(5, 100, n_rows),
+    })
+
+
+def _overlaps(a, b):
+    ax, ay, al, aw = a
+    bx, by, bl, bw = b
+    return ax < bx + bl and bx < ax + al and ay < by + bw and by < ay + aw
+
+
+def test_place_in_rects_keeps_free_rects_disjoint_and_inside_floor():
+    place = getattr(app._place_in_rects, 'py_func', app._place_in_rects)
+    rnd = random.Random(0)
+    for _ in range(500):
+        rx, ry, rl, rw = [0.0], [0.0], [FLOOR_L], [FLOOR_W]
+        placed_area = 0.0
+        for _ in range(rnd.randint(1, 6)):
+            l, w = float(rnd.randint(5, 110)), float(rnd.randint(5, 110))
+            count = float(rnd.randint(1, 30))
+            placed, length_extent, width_extent = place(l, w, count, rx, ry, rl, rw, 0, l, w)
+            assert 0 <= placed <= count
+            assert length_extent <= FLOOR_L and width_extent <= FLOOR_W
+            placed_area += placed * l * w
+
+        rects = [r for r in zip(rx, ry, rl, rw) if r[2] > 0 and r[3] > 0]
+        for x, y, l, w in rects:
+            assert x >= 0 and y >= 0 and x + l <= FLOOR_L and y + w <= FLOOR_W
+        for i, a in enumerate(rects):
+            for b in rects[i + 1:]:
+                assert not _overlaps(a, b)
+        # Free space and placed cartons exactly tile the floor, so placed blocks cannot overlap
+        assert sum(l * w for _, _, l, w in rects) + placed_area == FLOOR_L * FLOOR_W
+
+
+
+def test_place_in_rects_precomputed_floor_fit_matches_computed():
+    place = getattr(app._place_in_rects, 'py_func', app._place_in_rects)
+    rng = np.random.default_rng(1)
+    L = rng.integers(5, 130, 300).astype(float)
+    W = rng.integers(5, 110, 300).astype(float)
+    cpl, used_Ls, used_Ws = app._vec_cpl(L, W)
+    for i in range(len(L)):
+        if cpl[i] == 0:
+            continue
+        count = float(rng.integers(1, 2 * cpl[i] + 1))
+        computed = ([0.0], [0.0], [FLOOR_L], [FLOOR_W])
+        hinted = ([0.0], [0.0], [FLOOR_L], [FLOOR_W])
+        expected = place(L[i], W[i], count, *computed, 0, L[i], W[i])
+        actual = place(L[i], W[i], count, *hinted, cpl[i], used_Ls[i], used_Ws[i])
+        assert actual == expected
+        assert hinted == computed
+
+
+def test_pack_all_packs_every_packable_carton_per_fba_code():
+    for seed in range(20):
+        df = app.clean_input(_random_upload(seed, 5 + seed * 3, 1 + seed % 4))
+        result = app.pack_all(df)
+
+        cpl = app._vec_cpl(df['Length'].to_numpy(), df['Width'].to_numpy())[0]
+        packable = df[(cpl > 0) & (df['Height'] <= app.PALLET_HEIGHT)]
+        expected = packable.groupby('FBA Code')['# of Cartons'].sum()
+        packed = result.groupby('FBA Code')['Packed Cartons'].sum()
+        pd.testing.assert_series_equal(packed, expected, check_names=False, check_dtype=False)
+
+
+def test_pack_all_details_and_extents_are_consistent():
+    df = app.clean_input(_random_upload(42, 60, 3))
+    result = app.pack_all(df)
+    assert not result.empty
+    assert (result['Total Height Used'] <= app.PALLET_HEIGHT).all()
+    assert (result['Total Length Used'] <= app.PALLET_LENGTH).all()
+    assert (result['Total Width Used'] <= app.PALLET_WIDTH).all()
+    for details, packed in zip(result['Details'], result['Packed Cartons']):
+        assert sum(int(part.rsplit(':', 1)[1]) for part in details.split('; ')) == packed
+
+
+def test_shorter_cartons_share_a_partial_layer():
+    # 4 tall cartons cover half the floor; the short ones fill the rest of that layer
+    df = app.clean_input(pd.DataFrame({
+        'FBA Code': ['A', 'A'],
+        '# of Cartons': [4, 4],
+        'Length': [61, 61],
+        'Width': [25, 25],
+        'Height': [100, 50],
+    }))
+    result = app.pack_all(df)
+    assert len(result) == 1
+    assert result['Packed Cartons'].iloc[0] == 8
+    assert result['Total Height Used'].iloc[0] == 100
+
+
+def test_blank_fba_code_row_is_dropped():
+    csv = b"FBA Code,# of Cartons,Length,Width,Height\n,4,10,10,10\nA,4,10,10,10\n"
+    df = app.clean_input(app.read_upload(csv, "upload.csv"))
+    assert df['FBA Code'].tolist() == ['A']
+    result = app.pack_all(df)
+    assert result['FBA Code'].tolist() == ['A']
+    assert result['Packed Cartons'].sum() == 4
+
+
+
+def test_ragged_csv_row_is_dropped():
+    csv = b"FBA Code,# of Cartons,Length,Width,Height\nA,4,10,10,10\nB,3,10,10\n"
+    df = app.clean_input(app.read_upload(csv, "upload.csv"))
+    assert df['FBA Code'].tolist() == ['A']
+    assert app.pack_all(df)['Packed Cartons'].sum() == 4
+
+
+def test_duplicate_csv_header_is_renamed():
+    csv = b"FBA Code,# of Cartons,Length,Width,Height,Length\nA,4,10,10,10,99\n"
+    df = app.clean_input(app.read_upload(csv, "upload.csv"))
+    assert list(df.columns) == ['FBA Code', '# of Cartons', 'Length', 'Width', 'Height', 'Length.1']
+    assert app.pack_all(df)['Packed Cartons'].sum() == 4
+
+
+def test_read_upload_uses_first_sheet_of_workbook():
+    buf = BytesIO()
+    with pd.ExcelWriter(buf, engine='openpyxl') as writer:
+        pd.DataFrame({'FBA Code': ['A'], '# of Cartons': [4], 'Length': [10], 'Width': [10], None: [1],
+                      'Height': [10]}).to_excel(writer, sheet_name='Data', index=False)
+        pd.DataFrame({'hello': [1]}).to_excel(writer, sheet_name='Notes', index=False)
+        writer.book.active = 1
+    df = app.read_upload(buf.getvalue(), "upload.xlsx")
+    assert list(df.columns) == ['FBA Code', '# of Cartons', 'Length', 'Width', 'Unnamed: 4', 'Height']